@@ -1,21 +1,41 @@
+import io
 import re
 import os
+import functools
+import concurrent.futures
 
 """
 Python module for converting bython code to python code.
 """
 
-def _ends_in_by(word):
-    """
-    Returns True if word ends in .by, else False
+# Pattern used for scanning imports. The first group matches 'import x', the
+# second matches 'from x import y'
+_IMPORT_RE = re.compile(r"(?<=import\s)([\w.]+)(?=;|\s|$)|(?<=from\s)([\w.]+)(?=\s+import)")
 
-    Args:
-        word (str):     Filename to check
+# Patterns used by parse_file_recursively and its helpers
+_INDENTED_NEWLINE_RE = re.compile(r"\r?\n[ \t]+")
+_COMMENT_BEFORE_BRACE_RE = re.compile(r"[ \t]*((?:\/\/|\#).*)?\r?\n[ \t]*\{")
+_SPACE_AFTER_BRACE_RE = re.compile(r"(?<=\})[ \t]+\n")
+_ELSE_AFTER_BRACE_RE = re.compile(r"(?<=\})[ \t]+(else|elif)")
+_CODE_AFTER_BRACE_RE = re.compile(r"(?<=\n\})([^\n]+)(?=\n)")
+_SPACE_BEFORE_BRACE_RE = re.compile(r"[ \t]+(?=\{\n)")
+_SEMICOLON_RE = re.compile(r"[ \t]*;[ \t]*((?:\/\/|\#).*)?\r?(?=\n)")
+_TRAILING_SPACE_RE = re.compile(r"[ \t]\r?\n")
+_EMPTY_LINES_RE = re.compile(r"\r?\n[ \t]*(?:\r?\n[ \t]*)+")
+_WHITESPACE_RE = re.compile(r"\s")
+_PLAIN_CODE_RE = re.compile(r"[^{}()#/'\"=\n]+")
 
-    Returns:
-        boolean: Whether 'word' ends with 'by' or not
-    """
-    return word[-3:] == ".by"
+# Shared by both parsers
+_ELSE_IF_RE = re.compile(r"else\s+if")
+
+# Total size of the sources (in characters) from which converting a project in
+# a pool of worker processes pays off. Below this, starting the workers takes
+# longer than converting the files one after another
+_PARALLEL_MIN_SIZE = 1 << 20
+
+# Results of parse_imports, keyed by absolute path. Each entry is a
+# (modification time, size, imports) tuple, so changed files are scanned again
+_imports_cache = {}
 
 
 def _change_file_name(name, outputname=None):
@@ -37,13 +57,112 @@ def _change_file_name(name, outputname=None):
         return outputname
 
     # Otherwise, create a new name
-    if _ends_in_by(name):
+    if name.endswith(".by"):
         return name[:-3] + ".py"
 
     else:
         return name + ".py"
 
 
+def _compile_import_patterns(change_imports):
+    """
+    Compiles the patterns used for renaming imported bython modules. All
+    modules are matched by one alternation for 'import x' and one for
+    'from x import y', so renaming takes two passes no matter how many
+    modules there are.
+
+    Args:
+        change_imports (dict):      Names of imported bython modules, and their
+                                    python alternative.
+
+    Returns:
+        tuple of (re.Pattern, function): Compiled patterns and their
+        replacement functions.
+    """
+    # The same translations are normally used for every file in a project, so
+    # the patterns are cached
+    return _compile_import_patterns_cached(tuple(change_imports.items()))
+
+
+@functools.lru_cache(maxsize=32)
+def _compile_import_patterns_cached(import_items):
+    """
+    Cached implementation of _compile_import_patterns.
+
+    Args:
+        import_items (tuple):       The items of the change_imports dict
+
+    Returns:
+        tuple of (re.Pattern, function): Compiled patterns and their
+        replacement functions.
+    """
+    if not import_items:
+        return ()
+
+    change_imports = dict(import_items)
+
+    # Longest names first, so 'a.b' is not matched as 'a' followed by '.b'
+    modules = "|".join(
+        re.escape(module) for module in sorted(change_imports, key=len, reverse=True)
+    )
+
+    return (
+        (
+            re.compile(r"(?<=import\s)(" + modules + r")\b"),
+            lambda m: "{} as {}".format(change_imports[m.group(1)], m.group(1))
+        ),
+        (
+            re.compile(r"(?<=from\s)(" + modules + r")(?=\s+import)"),
+            lambda m: change_imports[m.group(1)]
+        ),
+    )
+
+
+def _rename_imports(code, import_patterns):
+    """
+    Renames imported bython modules to their python alternative.
+
+    Args:
+        code (str):                     The string that will be manipulated
+        import_patterns (tuple):        Patterns and replacement functions, as
+                                        returned by _compile_import_patterns
+
+    Returns:
+        str: A string with the changes applied
+    """
+    for pattern, replacement in import_patterns:
+        code = pattern.sub(replacement, code)
+
+    return code
+
+
+def _read_file(filepath):
+    """
+    Reads a whole file into a string with a single read call.
+
+    Args:
+        filepath (str):     Path to file
+
+    Returns:
+        str: The contents of the file
+    """
+    with open(filepath, 'r') as infile:
+        return infile.read()
+
+
+def _parse_imports_from_text(code):
+    """
+    Scans a string for imports. See parse_imports.
+
+    Args:
+        code (str):         The string to scan
+
+    Returns:
+        list of str: All imported modules, suffixed with '.by'.
+    """
+    return [(im or from_im) + ".by" for im, from_im in _IMPORT_RE.findall(code)]
+
+
 def parse_imports(filename):
     """
     Reads the file, and scans for imports. Returns all the assumed filename
@@ -56,19 +175,150 @@ def parse_imports(filename):
         list of str: All imported modules, suffixed with '.by'. Ie, the name
         the imported files must have if they are bython files.
     """
-    infile = open(filename, 'r')
-    infile_str = ""
+    # Files that have not changed since the last call are not scanned again
+    path = os.path.abspath(filename)
+    stat = os.stat(path)
+
+    entry = _imports_cache.get(path)
+
+    if entry is None or entry[:2] != (stat.st_mtime_ns, stat.st_size):
+        entry = (stat.st_mtime_ns, stat.st_size, _parse_imports_from_text(_read_file(path)))
+        _imports_cache[path] = entry
+
+    # Return a copy, so callers can't modify the cached list
+    return list(entry[2])
+
+
+def _reindent(code, indentation_sign="    "):
+    """
+    Replaces braces with indentation in a single pass over the code. Braces
+    inside strings and comments are left as they are, and //-comments are
+    turned into #-comments.
+
+    Args:
+        code (str):                 The string that will be manipulated
+        indentation_sign (str):     The indentation style (usually spaces or
+                                    tabs)
 
-    for line in infile:
-        infile_str += line
+    Yields:
+        str: The re-indented lines, including the trailing newline
+    """
+    indentation_level = 0
+    indentation = ""
+
+    # State of the current line
+    line = []
+    comment = []
+    has_code = False
+    leading_closed = 0
+    opened = 0
+    closed = 0
+
+    # Delimiter of the string we are inside of (None if not in a string)
+    quote = None
+    in_comment = False
+
+    position = 0
+    length = len(code)
+
+    # The end of the code is treated as a final newline
+    while position <= length:
+        char = code[position] if position < length else "\n"
+
+        # Inside strings, copy everything until the closing delimiter.
+        # Unterminated single-line strings end at the newline, and all
+        # unterminated strings end at the end of the code
+        if quote is not None and position < length and not (char == "\n" and len(quote) == 1):
+            if char == "\\":
+                # a backslash at the end of the code has nothing to escape
+                escaped = code[position:position + 2]
+                line.append(escaped)
+                position += len(escaped)
+            elif code.startswith(quote, position):
+                line.append(quote)
+                position += len(quote)
+                quote = None
+            else:
+                line.append(char)
+                position += 1
+            continue
 
+        quote = None
 
-    imports = re.findall(r"(?<=import\s)[\w.]+(?=;|\s|$)", infile_str)
-    imports2 = re.findall(r"(?<=from\s)[\w.]+(?=\s+import)", infile_str)
+        # Inside comments, copy everything until the end of the line
+        if in_comment and char != "\n":
+            comment.append(char)
+            position += 1
+            continue
 
-    imports_with_suffixes = [im + ".by" for im in imports + imports2]
+        if char == "\n":
+            # Closing braces in front of the code reduce the indentation of
+            # this line, all other braces affect the lines that follow
+            if leading_closed:
+                indentation_level -= leading_closed
+                indentation = indentation_level*indentation_sign
+
+            # A semicolon followed by whitespace at the end of the line is
+            # removed
+            text = "".join(line)
+            stripped = text.rstrip(" \t")
+            if stripped != text and stripped.endswith(";"):
+                stripped = stripped[:-1]
+            text = stripped.strip()
+            comment_text = "".join(comment)
+
+            if text == "":
+                yield indentation + comment_text.lstrip() + "\n"
+            else:
+                yield indentation + text + comment_text + "\n"
+
+            if opened != closed:
+                indentation_level += opened - closed
+                indentation = indentation_level*indentation_sign
+
+            line = []
+            comment = []
+            has_code = False
+            leading_closed = opened = closed = 0
+            in_comment = False
+            position += 1
+
+        elif char == "#" or code.startswith("//", position):
+            # Keep the whitespace in front of the comment with the comment
+            while line and line[-1] in " \t":
+                comment.insert(0, line.pop())
+
+            comment.append("#")
+            in_comment = True
+            position += 1 if char == "#" else 2
+
+        elif char == "'" or char == "\"":
+            quote = char*3 if code.startswith(char*3, position) else char
+            line.append(quote)
+            has_code = True
+            position += len(quote)
+
+        elif char == "{":
+            while line and line[-1] in " \t":
+                line.pop()
+
+            line.append(":")
+            has_code = True
+            opened += 1
+            position += 1
+
+        elif char == "}":
+            if has_code:
+                closed += 1
+            else:
+                leading_closed += 1
+            position += 1
 
-    return imports_with_suffixes
+        else:
+            line.append(char)
+            if not char.isspace():
+                has_code = True
+            position += 1
 
 
 def parse_file(filepath, add_true_line, filename_prefix, outputname=None, change_imports=None):
@@ -92,20 +342,16 @@ def parse_file(filepath, add_true_line, filename_prefix, outputname=None, change
     filename = os.path.basename(filepath)
     filedir = os.path.dirname(filepath)
 
-    infile = open(filepath, 'r')
+    # Read file to string
+    infile_str_raw = _read_file(filepath)
+
     outfile = open(filename_prefix + _change_file_name(filename, outputname), 'w')
 
-    indentation_level = 0
     indentation_sign = "    "
 
     if add_true_line:
         outfile.write("true=True; false=False;\n")
 
-    # Read file to string
-    infile_str_raw = ""
-    for line in infile:
-        infile_str_raw += line
-
     # Add 'pass' where there is only a {}. 
     # 
     # DEPRECATED FOR NOW. This way of doing
@@ -115,70 +361,18 @@ def parse_file(filepath, add_true_line, filename_prefix, outputname=None, change
     # infile_str_raw = re.sub(r"{[\s\n\r]*}", "{\npass\n}", infile_str_raw)
 
     # Fix indentation
-    infile_str_indented = ""
-    for line in infile_str_raw.split("\n"):
-        # Search for comments, and remove for now. Re-add them before writing to
-        # result string
-        m = re.search(r"[ \t]*([(\/\/)#].*$)", line)
-
-        # Make sure # sign is not inside quotations. Delete match object if it is
-        if m is not None:
-            m2 = re.search(r"[\"'].*[(\/\/)#].*[\"']", m.group(0))
-            if m2 is not None:
-                m = None
-
-        if m is not None:
-            add_comment = m.group(0)
-            line = re.sub(r"[ \t]*([(\/\/)#].*$)", "", line)
-        else:
-            add_comment = ""
-        
-        # replace // with #
-        add_comment = add_comment.replace("//", "#", 1)
-
-        # skip empty lines:
-        if line.strip() in ('\n', '\r\n', ''):
-            infile_str_indented += indentation_level*indentation_sign + add_comment.lstrip() + "\n"
-            continue
+    infile_str_indented = "".join(_reindent(infile_str_raw, indentation_sign))
 
-        # remove existing whitespace:
-        line = line.lstrip()
-        
-        # Check for reduced indent level
-        for i in list(line):
-            if i == "}":
-                indentation_level -= 1
-
-        # Add indentation
-        for i in range(indentation_level):
-            line = indentation_sign + line
-
-        # Check for increased indentation
-        for i in list(line):
-            if i == "{":
-                indentation_level += 1
-
-        # Replace { with : and remove }
-        line = re.sub(r"[\t ]*{[ \t]*", ":", line)
-        line = re.sub(r"}[ \t]*", "", line)
-        line = re.sub(r"\n:", ":", line)
-
-        infile_str_indented += line + add_comment + "\n"
-
-
-    # Support for extra, non-brace related stuff
-    infile_str_indented = re.sub(r"else\s+if", "elif", infile_str_indented)
-    infile_str_indented = re.sub(r";[ \t]+\n", "\n", infile_str_indented)
+    # Support for extra, non-brace related stuff. The substitutions run on the
+    # whole file, as both 'else if' and imports may span several lines
+    if "else" in infile_str_indented:
+        infile_str_indented = _ELSE_IF_RE.sub("elif", infile_str_indented)
 
     # Change imported names if necessary
     if change_imports is not None:
-        for module in change_imports:
-            infile_str_indented = re.sub("(?<=import\\s){}".format(module), "{} as {}".format(change_imports[module], module), infile_str_indented)
-            infile_str_indented = re.sub("(?<=from\\s){}(?=\\s+import)".format(module), change_imports[module], infile_str_indented)
+        infile_str_indented = _rename_imports(infile_str_indented, _compile_import_patterns(change_imports))
 
     outfile.write(infile_str_indented)
-
-    infile.close()
     outfile.close()
 
 
@@ -192,8 +386,8 @@ def remove_indentation(code):
     Returns:
         str: A string with the changes applied
     """
-    code = re.sub(r"^[ \t]*", "", code, 1)
-    code = re.sub(r"\r?\n[ \t]+", "\n", code)
+    code = code.lstrip(" \t")
+    code = _INDENTED_NEWLINE_RE.sub("\n", code)
     return code
 
 
@@ -212,11 +406,11 @@ def prepare_braces(code):
 
     # TODO fix issue with brace within comments
     # TODO fix removing spaces and tabs from within strings
-    code = re.sub(r"[ \t]*(\/\/.*|\#.*)?\r?\n[ \t]*\{", "{ \\1\n", code)
-    code = re.sub(r"(?<=\})[ \t]+\n", "\n", code)
-    code = re.sub(r"(?<=\})[ \t]+((else|elif))", "\n\\1", code)
-    code = re.sub(r"(?<=\n\})([^\n]+?)(?=\n)", "\n\\1", code)
-    code = re.sub(r"[ \t]+(?=\{\n)", "", code)
+    code = _COMMENT_BEFORE_BRACE_RE.sub("{ \\1\n", code)
+    code = _SPACE_AFTER_BRACE_RE.sub("\n", code)
+    code = _ELSE_AFTER_BRACE_RE.sub("\n\\1", code)
+    code = _CODE_AFTER_BRACE_RE.sub("\n\\1", code)
+    code = _SPACE_BEFORE_BRACE_RE.sub("", code)
     return code
 
 
@@ -232,13 +426,17 @@ def remove_semicolons(code):
     """
     # remove semicolons, but keep any comments
     # TODO fix: if a semicolon is follwed by a comment starter '//' or '#', the semicolon will be removed even inside strings or comments
-    code = re.sub(r"[ \t]*;[ \t]*(\/\/.*|\#.*)?\r?(?=\n)", " \\1", code)
+    code = _SEMICOLON_RE.sub(" \\1", code)
 
     # remove any extra spaces added at the end of lines
-    code = re.sub(r"[ \t]\r?\n", "\n", code)
+    code = _TRAILING_SPACE_RE.sub("\n", code)
     
-    # remove a semicolon placed right before the EOF
-    code = re.sub(r";$", "", code)
+    # remove a semicolon placed right before the EOF, or before a newline at
+    # the EOF
+    if code.endswith(";"):
+        code = code[:-1]
+    elif code.endswith(";\n"):
+        code = code[:-2] + "\n"
     return code
 
 
@@ -252,7 +450,7 @@ def remove_empty_lines(code):
     Returns:
         str: A string with the changes applied
     """
-    code = re.sub(r"\r?\n[ \t]*(\r?\n[ \t]*)+", "\n", code)
+    code = _EMPTY_LINES_RE.sub("\n", code)
     return code
 
 
@@ -267,331 +465,450 @@ def indent_if_newline(code, outfile, indentation, indentation_str):
         indentation_str (str):      The indentation style (usually spaces or tabs)
     """
     if code == "\n":
-        for x in range(indentation):
-            outfile.write(indentation_str)
+        outfile.write(indentation_str * indentation)
 
 
-def parse_file_recursively(filepath, add_true_line=False, filename_prefix="", outputname=None, change_imports=None, debug_mode=False):
+def _recursive_parser(code, position, scope, outfile, indentation, indentation_str="    ", debug_mode=False):
     """
-    Converts a bython file to a python file recursively and writes it to disk.
+    Recursive function for scope detection and for writing the final .py code to disk
 
     Args:
-        filename (str):             Path to the bython file you want to parse.
-        add_true_line (boolean):    Whether to add a line at the top of the
-                                    file, adding support for C-style true/false
-                                    in addition to capitalized True/False.
-        filename_prefix (str):      Prefix to resulting file name (if -c or -k
-                                    is not present, then the files are prefixed
-                                    with a '.').
-        outputname (str):           Optional. Override name of output file. If
-                                    omitted it defaults to substituting '.by' to
-                                    '.py'    
-        change_imports (dict):      Names of imported bython modules, and their 
-                                    python alternative.
-        debug_mode (boolean):       Enables debug output (scope detection)
+        code (str):             The string that will be interpreted
+        position (int):         Current position on the code string
+        scope (str):            Current scope ("", "{", "(", "#", "//"
+                                "/*", "/'", "/"", "=", "={")
+        outfile (file)          The output file (or in-memory stream) which
+                                will be writen to
+        indentation (int):      The current indentation level
+        indentation_str (str):  The indentation style (usually spaces or tabs)
+        debug_mode (boolean):   Enables debug output (scope detection)
+
+    Returns:
+        int: Next position on the string
+
+    Raises:
+        SyntaxError: If a string or a c style comment is not terminated.
     """
-    
-    # inner function for parsing recursively
-    def recursive_parser(code, position, scope, outfile, indentation, indentation_str="    ", debug_mode=False):
-        """
-        Recursive inner function for scope detection and for writing the final .py code to disk
-
-        Args:
-            code (str):             The string that will be interpreted
-            position (int):         Current position on the code string
-            scope (str):            Current scope ("", "{", "(", "#", "//"
-                                    "/*", "/'", "/"", "=", "={")
-            outfile (file)          The output file which will be writen to
-            indentation (int):      The current indentation level
-            indentation_str (str):  The indentation style (usually spaces or tabs)
-            debug_mode (boolean):   Enables debug output (scope detection)
-
-        Returns:
-            int: Next position on the string
-        """
-        # scope equal to "" means it's on global scope
-        # scope equal to "{" means it's on a local scope
-        # scope equal to "(" means it's inside function parameters or tuples
-        if scope == "" or scope == "{" or scope == "(":
-
-            if scope == "":
-                if debug_mode:
-                    print("g", end="") # for debugging
-            else:
-                indentation = indentation + 1
+    # scope equal to "" means it's on global scope
+    # scope equal to "{" means it's on a local scope
+    # scope equal to "(" means it's inside function parameters or tuples
+    if scope == "" or scope == "{" or scope == "(":
 
-            # keep parsing until EOF
-            while position < len(code):
+        if scope == "":
+            if debug_mode:
+                print("g", end="") # for debugging
+        else:
+            indentation = indentation + 1
 
-                # check for brace opening
-                if code[position] == "{":
-                    if debug_mode:
-                        print("{", end="") # for debugging
-                    outfile.write(":")
-                    position = recursive_parser(code, position + 1, "{", outfile, indentation, indentation_str, debug_mode)
-                    if scope == "":
-                        if debug_mode:
-                            print("g", end="") # for debugging
-                
-                # check for parenthesis opening
-                if code[position] == "(":
-                    if debug_mode:
-                        print("(", end="") # for debugging
-                    outfile.write(code[position])
-                    position = recursive_parser(code, position + 1, "(", outfile, indentation, indentation_str, debug_mode)
-
-                # check for python-style comment
-                elif code[position] == "#":
-                    outfile.write(code[position])
-                    position = recursive_parser(code, position + 1, "#", outfile, indentation, indentation_str, debug_mode)
-                
-                # check for c and cpp-style comment
-                elif code[position] == "/":
-                    #if code[position + 1] == "/":
-                        #outfile.write("#")
-                        #position = recursive_parser(code, position + 2, "//", outfile, indentation, indentation_str, debug_mode)
-                    if code[position + 1] == "*":
-                        outfile.write("#")
-                        outfile.write(code[position:position+2])
-                        position = recursive_parser(code, position + 2, "/*", outfile, indentation, indentation_str, debug_mode)
-                    else:
-                        outfile.write("/")
-                        position = position + 1
-                
-                # check for single-quote string start
-                elif code[position] == "\'":
-                    outfile.write("\'")
-                    position = recursive_parser(code, position + 1, "\'", outfile, indentation, indentation_str, debug_mode)
-
-                # check for double-quote string start
-                elif code[position] == "\"":
-                    outfile.write("\"")
-                    position = recursive_parser(code, position + 1, "\"", outfile, indentation, indentation_str, debug_mode)
-                
-                # check for equals (for python dicts with braces)
-                elif code[position] == "=":
-                    outfile.write(code[position])
-                    position = recursive_parser(code, position + 1, "=", outfile, indentation, indentation_str, debug_mode)
-
-                # check for brace closing (when not on global)
-                elif scope == "{":
-                    if code[position] == "}":
-                        if debug_mode:
-                            print("}", end="")
-                        return position + 1
-                    else:
-                        if code[position] == "\n" and code[position + 1] == "}":
-                                pass
-                        else:
-                            outfile.write(code[position])
-                            indent_if_newline(code[position], outfile, indentation, indentation_str)
-                        position = position + 1
-                
-                # check for parenthesis opening
-                elif scope == "(":
-                    outfile.write(code[position])
-                    indent_if_newline(code[position], outfile, indentation, indentation_str)
-                    if code[position] == ")":
-                        if debug_mode:
-                            print(")", end="")
-                        return position + 1
-                    position = position + 1
+        # bind loop invariants to locals
+        code_length = len(code)
+        match_plain_code = _PLAIN_CODE_RE.match
+        write = outfile.write
 
-                else:
-                    outfile.write(code[position])
-                    indent_if_newline(code[position], outfile, indentation, indentation_str)
-                    position = position + 1
+        # keep parsing until EOF
+        while position < code_length:
 
-        # scope equal to "#" means it's inside a python style comment
-        elif scope == "#":
-            if debug_mode:
-                print("#", end="") # for debugging
-            while position < len(code):
-                outfile.write(code[position])
-                indent_if_newline(code[position], outfile, indentation, indentation_str)
-                if code[position] == "\n":
-                    if debug_mode:
-                        print("n", end="") # for debugging
-                    return position + 1
+            # copy runs of characters without special meaning in one go
+            match = match_plain_code(code, position)
+            if match is not None:
+                write(match.group())
+                position = match.end()
+                continue
+
+            char = code[position]
 
+            # check for brace opening
+            if char == "{":
+                if debug_mode:
+                    print("{", end="") # for debugging
+                write(":")
+                position = _recursive_parser(code, position + 1, "{", outfile, indentation, indentation_str, debug_mode)
+                if scope == "":
+                    if debug_mode:
+                        print("g", end="") # for debugging
+                char = code[position]
+            
+            # check for parenthesis opening
+            if char == "(":
+                if debug_mode:
+                    print("(", end="") # for debugging
+                write(char)
+                position = _recursive_parser(code, position + 1, "(", outfile, indentation, indentation_str, debug_mode)
+
+            # check for python-style comment
+            elif char == "#":
+                write(char)
+                position = _recursive_parser(code, position + 1, "#", outfile, indentation, indentation_str, debug_mode)
+            
+            # check for c and cpp-style comment
+            elif char == "/":
+                #if code[position + 1] == "/":
+                    #outfile.write("#")
+                    #position = _recursive_parser(code, position + 2, "//", outfile, indentation, indentation_str, debug_mode)
+                if code[position + 1] == "*":
+                    write("#")
+                    write(code[position:position+2])
+                    position = _recursive_parser(code, position + 2, "/*", outfile, indentation, indentation_str, debug_mode)
                 else:
+                    write("/")
                     position = position + 1
-        
-        # scope equal to "//" means it's inside a c++ style comment
-        elif scope == "//":
-            if debug_mode:
-                print("//", end="") # for debugging
-            while position < len(code):
-                outfile.write(code[position])
-                indent_if_newline(code[position], outfile, indentation, indentation_str)
-                if code[position] == "\n":
+            
+            # check for single-quote string start
+            elif char == "\'":
+                write("\'")
+                position = _recursive_parser(code, position + 1, "\'", outfile, indentation, indentation_str, debug_mode)
+
+            # check for double-quote string start
+            elif char == "\"":
+                write("\"")
+                position = _recursive_parser(code, position + 1, "\"", outfile, indentation, indentation_str, debug_mode)
+            
+            # check for equals (for python dicts with braces)
+            elif char == "=":
+                write(char)
+                position = _recursive_parser(code, position + 1, "=", outfile, indentation, indentation_str, debug_mode)
+
+            # check for brace closing (when not on global)
+            elif scope == "{":
+                if char == "}":
                     if debug_mode:
-                        print("n", end="") # for debugging
+                        print("}", end="")
                     return position + 1
-
                 else:
-                    position = position + 1
-        
-        # scope equal to "/*" means it's inside a c style comment
-        elif scope == "/*":
-            if debug_mode:
-                print("/*", end="") # for debugging
-            while position < len(code):
-                outfile.write(code[position])
-                indent_if_newline(code[position], outfile, indentation, indentation_str)
-                if code[position] == "\n":
-                    outfile.write("#")
-
-                # check for c-style comment closing
-                if code[position] == "*":
-                    if code[position + 1] == "/":
-                        if debug_mode:
-                            print("*/", end="") # for debugging
-                        outfile.write(code[position + 1])
-                        return position + 2
+                    if char == "\n" and code[position + 1] == "}":
+                            pass
                     else:
-                        position = position + 1
-                
-                else:
+                        write(char)
+                        indent_if_newline(char, outfile, indentation, indentation_str)
                     position = position + 1
+            
+            # check for parenthesis opening
+            elif scope == "(":
+                write(char)
+                indent_if_newline(char, outfile, indentation, indentation_str)
+                if char == ")":
+                    if debug_mode:
+                        print(")", end="")
+                    return position + 1
+                position = position + 1
 
-        # scope equal to "\'" means it's inside a single quote string
-        elif scope == "\'":
-            if debug_mode:
-                print("\'^", end="") # for debugging
-            while position < len(code):
+            else:
+                write(char)
+                indent_if_newline(char, outfile, indentation, indentation_str)
+                position = position + 1
+
+    # scope equal to "#" means it's inside a python style comment, and scope
+    # equal to "//" means it's inside a c++ style comment
+    elif scope == "#" or scope == "//":
+        if debug_mode:
+            print(scope, end="") # for debugging
+
+        # copy everything up to and including the end of the line
+        end = code.find("\n", position)
+        if end == -1:
+            outfile.write(code[position:])
+            return len(code)
+
+        outfile.write(code[position:end + 1])
+        indent_if_newline("\n", outfile, indentation, indentation_str)
+        if debug_mode:
+            print("n", end="") # for debugging
+        return end + 1
+    
+    # scope equal to "/*" means it's inside a c style comment
+    elif scope == "/*":
+        if debug_mode:
+            print("/*", end="") # for debugging
+
+        # copy everything up to and including the comment closing, and turn
+        # each new line into an indented python style comment
+        end = code.find("*/", position)
+        if end == -1:
+            # the position in the preprocessed code would not match the file,
+            # so the start of the comment is shown instead
+            raise SyntaxError("unterminated comment: %s" % code[position - 2:].split("\n", 1)[0])
+
+        if debug_mode:
+            print("*/", end="") # for debugging
+        end = end + 2
+
+        outfile.write(code[position:end].replace("\n", "\n" + indentation_str * indentation + "#"))
+        return end
+
+    # scope equal to "\'" means it's inside a single quote string, and scope
+    # equal to "\"" means it's inside a double quote string
+    elif scope == "\'" or scope == "\"":
+        if debug_mode:
+            print(scope + "^", end="") # for debugging
+
+        # find the string ending, skipping escaped quotes
+        end = code.find(scope, position)
+        while end != -1 and code[end - 1] == "\\":
+            end = code.find(scope, end + 1)
+
+        if end == -1:
+            # the position in the preprocessed code would not match the file,
+            # so the start of the string is shown instead
+            raise SyntaxError("unterminated string: %s" % code[position - 1:].split("\n", 1)[0])
+
+        if debug_mode:
+            print("$" + scope, end="") # for debugging
+        end = end + 1
+
+        outfile.write(code[position:end].replace("\n", "\n" + indentation_str * indentation))
+        return end
+    
+    # scope equal to "=" means a possible python dictionary
+    elif scope == "=":
+        if debug_mode:
+            print("=", end="") # for debugging
+        while position < len(code):
+            # check for dicts
+            if code[position] == "{":
                 outfile.write(code[position])
                 indent_if_newline(code[position], outfile, indentation, indentation_str)
-                # check for single-quote string ending
-                if code[position] == "\'":
-                    # check if its escaped
-                    if code[position - 1] != "\\":
-                        if debug_mode:
-                            print("$\'", end="") # for debugging
-                        return position + 1
-                    else:
-                        position = position + 1
+                if debug_mode:
+                    print(".dict.", end="") # for debugging
+                return _recursive_parser(code, position + 1, "={", outfile, indentation + 1, indentation_str, debug_mode)
 
-                else:
-                    position = position + 1
-        
-        # scope equal to "\"" means it's inside a double quote string
-        elif scope == "\"":
-            if debug_mode:
-                print("\"^", end="") # for debugging
-            while position < len(code):
+            # check for whitespaces/newlines
+            elif _WHITESPACE_RE.search(code[position]):
                 outfile.write(code[position])
                 indent_if_newline(code[position], outfile, indentation, indentation_str)
-                # check for single-quote string ending
-                if code[position] == "\"":
-                    # check if its escaped
-                    if code[position - 1] != "\\":
-                        if debug_mode:
-                            print("$\'", end="") # for debugging
-                        return position + 1
-                    else:
-                        position = position + 1
-                else:
-                    position = position + 1
-        
-        # scope equal to "=" means a possible python dictionary
-        elif scope == "=":
-            if debug_mode:
-                print("=", end="") # for debugging
-            while position < len(code):
-                # check for dicts
-                if code[position] == "{":
-                    outfile.write(code[position])
-                    indent_if_newline(code[position], outfile, indentation, indentation_str)
-                    if debug_mode:
-                        print(".dict.", end="") # for debugging
-                    return recursive_parser(code, position + 1, "={", outfile, indentation + 1, indentation_str, debug_mode)
+                position = position + 1
 
-                # check for whitespaces/newlines
-                elif re.search(r"[\s\n\r]", code[position]):
-                    outfile.write(code[position])
-                    indent_if_newline(code[position], outfile, indentation, indentation_str)
-                    position = position + 1
+            # if it gets here, non-dict was found
+            else:
+                indent_if_newline(code[position], outfile, indentation, indentation_str)
+                if debug_mode:
+                    print("!", end="") # for debugging
+                return position
+    
+    # scope equal to "={" means it's inside a python dictionary
+    elif scope == "={":
+        while position < len(code):
+            
+            if code[position] == "}":
+                outfile.write(code[position])
+                return position + 1
 
-                # if it gets here, non-dict was found
+            else:
+                outfile.write(code[position])
+                if code[position + 1] == "}":
+                    indent_if_newline(code[position], outfile, indentation - 1, indentation_str)
                 else:
                     indent_if_newline(code[position], outfile, indentation, indentation_str)
-                    if debug_mode:
-                        print("!", end="") # for debugging
-                    return position
-        
-        # scope equal to "={" means it's inside a python dictionary
-        elif scope == "={":
-            while position < len(code):
-                
-                if code[position] == "}":
-                    outfile.write(code[position])
-                    return position + 1
+                position = position + 1
 
-                else:
-                    outfile.write(code[position])
-                    if code[position + 1] == "}":
-                        indent_if_newline(code[position], outfile, indentation - 1, indentation_str)
-                    else:
-                        indent_if_newline(code[position], outfile, indentation, indentation_str)
-                    position = position + 1
-
-        # if scope is invalid an exception will be thrown
-        else:
-            raise Exception("invalid scope was reached")
+    # if scope is invalid an exception will be thrown
+    else:
+        raise Exception("invalid scope was reached")
 
 
-    # get filepath/filename
-    filename = os.path.basename(filepath)
+def _parse_code(code, add_true_line=False, change_imports=None, debug_mode=False, filename=None):
+    """
+    Converts bython code to python code, using the recursive parser.
 
-    # open input file
-    infile = open(filepath, 'r')
-    infile_str = infile.read()
-    infile.close()
+    Args:
+        code (str):                 The bython code to convert.
+        add_true_line (boolean):    Whether to add a line at the top of the
+                                    code, adding support for C-style true/false
+                                    in addition to capitalized True/False.
+        change_imports (dict):      Names of imported bython modules, and their 
+                                    python alternative.
+        debug_mode (boolean):       Enables debug output (scope detection)
+        filename (str):             Name of the bython file. Only used for
+                                    naming the filtered file in debug mode.
 
-    # open output file
-    outfile = open(filename_prefix + _change_file_name(filename, outputname), 'w')
+    Returns:
+        str: The resulting python code.
+    """
+    # the result is built in memory
+    result = io.StringIO()
 
     # true=True; false=False;
     if add_true_line:
-        outfile.write("true=True\nfalse=False\n")
+        result.write("true=True\nfalse=False\n")
     
     # remove indentation
-    infile_str = remove_indentation(infile_str)
+    code = remove_indentation(code)
 
     # rearrange braces
-    infile_str = prepare_braces(infile_str)
+    code = prepare_braces(code)
 
     # remove empty lines
-    infile_str = remove_empty_lines(infile_str)
+    code = remove_empty_lines(code)
 
     # change 'else if' into 'elif'
-    infile_str = re.sub(r"else\s+if", "elif", infile_str)
+    if "else" in code:
+        code = _ELSE_IF_RE.sub("elif", code)
 
     # remove semicolons
-    infile_str = remove_semicolons(infile_str)
+    code = remove_semicolons(code)
 
     # change imported names (if necessary)
     # TODO testing
     if change_imports is not None:
-        for module in change_imports:
-            infile_str = re.sub("(?<=import\\s){}".format(module), "{} as {}".format(change_imports[module], module), infile_str)
-            infile_str = re.sub("(?<=from\\s){}(?=\\s+import)".format(module), change_imports[module], infile_str)
+        code = _rename_imports(code, _compile_import_patterns(change_imports))
 
     # output filtered file (for debugging)
     if debug_mode:
         filtered_file = open(filename + ".filtered", 'w')
-        filtered_file.write(infile_str)
+        filtered_file.write(code)
         filtered_file.close()
     
     # adding a newline at EOF
-    infile_str += "\n"
+    code += "\n"
 
     # start recursive function
-    recursive_parser(infile_str, 0, "", outfile, 0, "    ", debug_mode)
+    _recursive_parser(code, 0, "", result, 0, "    ", debug_mode)
 
     if debug_mode:
         print("\n", end="")
 
-    # close output file
-    outfile.close()
\ No newline at end of file
+    return result.getvalue()
+
+
+def parse_string(code, add_true_line=False, change_imports=None):
+    """
+    Converts bython code to python code. Conversions are cached, so converting
+    the same code again with the same options is a cheap lookup.
+
+    Args:
+        code (str):                 The bython code to convert.
+        add_true_line (boolean):    Whether to add a line at the top of the
+                                    code, adding support for C-style true/false
+                                    in addition to capitalized True/False.
+        change_imports (dict):      Names of imported bython modules, and their 
+                                    python alternative.
+
+    Returns:
+        str: The resulting python code.
+    """
+    import_items = tuple(change_imports.items()) if change_imports is not None else None
+
+    return _parse_string_cached(code, add_true_line, import_items)
+
+
+@functools.lru_cache(maxsize=128)
+def _parse_string_cached(code, add_true_line, import_items):
+    """
+    Cached implementation of parse_string.
+
+    Args:
+        code (str):                 The bython code to convert.
+        add_true_line (boolean):    See parse_string.
+        import_items (tuple):       The items of the change_imports dict, or
+                                    None.
+
+    Returns:
+        str: The resulting python code.
+    """
+    change_imports = dict(import_items) if import_items is not None else None
+
+    return _parse_code(code, add_true_line, change_imports)
+
+
+def parse_file_recursively(filepath, add_true_line=False, filename_prefix="", outputname=None, change_imports=None, debug_mode=False, code=None):
+    """
+    Converts a bython file to a python file recursively and writes it to disk.
+
+    Args:
+        filename (str):             Path to the bython file you want to parse.
+        add_true_line (boolean):    Whether to add a line at the top of the
+                                    file, adding support for C-style true/false
+                                    in addition to capitalized True/False.
+        filename_prefix (str):      Prefix to resulting file name (if -c or -k
+                                    is not present, then the files are prefixed
+                                    with a '.').
+        outputname (str):           Optional. Override name of output file. If
+                                    omitted it defaults to substituting '.by' to
+                                    '.py'    
+        change_imports (dict):      Names of imported bython modules, and their 
+                                    python alternative.
+        debug_mode (boolean):       Enables debug output (scope detection)
+        code (str):                 Optional. Contents of the bython file, if
+                                    it has already been read. If omitted the
+                                    file is read from 'filepath'.
+    """
+
+    # get filepath/filename
+    filename = os.path.basename(filepath)
+
+    # read input file (unless the caller already did)
+    if code is None:
+        infile_str = _read_file(filepath)
+    else:
+        infile_str = code
+
+    # convert the code
+    result = _parse_code(infile_str, add_true_line, change_imports, debug_mode, filename)
+
+    # write output file in one go
+    outfile = open(filename_prefix + _change_file_name(filename, outputname), 'w')
+    outfile.write(result)
+    outfile.close()
+
+
+def parse_files(filepaths, add_true_line=False, filename_prefix="", outputnames=None, change_imports=None, max_workers=None, codes=None, return_exceptions=False):
+    """
+    Converts several bython files to python files and writes them to disk.
+    The files are independent of each other, so they are converted in
+    parallel, in a pool of worker processes.
+
+    Args:
+        filepaths (list of str):    Paths to the bython files you want to parse.
+        add_true_line (boolean):    Whether to add a line at the top of the
+                                    files, adding support for C-style true/false
+                                    in addition to capitalized True/False.
+        filename_prefix (str):      Prefix to resulting file names (if -c or -k
+                                    is not present, then the files are prefixed
+                                    with a '.').
+        outputnames (list of str):  Optional. Override name of output files,
+                                    one for each file in 'filepaths'. Entries
+                                    that are None default to substituting '.by'
+                                    to '.py'
+        change_imports (dict):      Names of imported bython modules, and their
+                                    python alternative.
+        max_workers (int):          Optional. Number of worker processes.
+                                    Defaults to the number of processors.
+        codes (list of str):        Optional. Contents of the bython files, one
+                                    for each file in 'filepaths', if they have
+                                    already been read.
+        return_exceptions (boolean): Optional. Return the exceptions raised
+                                    while parsing the files instead of raising
+                                    the first of them.
+
+    Returns:
+        list: Only if 'return_exceptions' is set. For each file in
+        'filepaths', the exception raised while parsing it, or None if it was
+        converted.
+
+    Raises:
+        ValueError: If 'outputnames' or 'codes' does not have one entry for
+        each file in 'filepaths'.
+        Any exception raised while parsing one of the files (unless
+        'return_exceptions' is set). If several files fail, the exception from
+        the first of them (in the order of 'filepaths') is raised.
+    """
+    if outputnames is None:
+        outputnames = [None] * len(filepaths)
+    elif len(outputnames) != len(filepaths):
+        raise ValueError("expected %d output names, got %d" % (len(filepaths), len(outputnames)))
+
+    if codes is None:
+        codes = [None] * len(filepaths)
+    elif len(codes) != len(filepaths):
+        raise ValueError("expected %d codes, got %d" % (len(filepaths), len(codes)))
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers) as executor:
+        futures = [
+            executor.submit(parse_file_recursively, filepath, add_true_line, filename_prefix, outputname, change_imports, False, code)
+            for filepath, outputname, code in zip(filepaths, outputnames, codes)
+        ]
+
+        if return_exceptions:
+            return [future.exception() for future in futures]
+
+        for future in futures:
+            future.result()